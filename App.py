@@ -1,13 +1,17 @@
 import streamlit as st
 import json
-import tempfile
 import os
 from datetime import datetime
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
 import pandas as pd
 
+from drive_helpers import (
+    DRIVE_SCOPES, MAIN_FOLDER_NAME, SUBFOLDERS, build_service, init_folder_map,
+    delete_file, restore_file, list_trashed_files, get_file_icon
+)
+from jobs import JobQueue, FINISHED_STATUSES
+from listing_cache import ListingCache, SearchCache
+
 st.set_page_config(page_title="Google Drive Business Manager Pro", layout="wide", initial_sidebar_state="expanded")
 
 # ---------------------------------------
@@ -103,7 +107,8 @@ page = st.sidebar.radio(
         "🧩 Canvas View",
         "📊 Analytics",
         "⚙️ Settings",
-        "🗑️ Trash Manager"
+        "🗑️ Trash Manager",
+        "🧵 Jobs"
     ]
 )
 
@@ -113,9 +118,15 @@ page = st.sidebar.radio(
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🔐 Authentication")
 
-json_file = st.sidebar.file_uploader("Service Account JSON", type=["json"], help="Upload your Google Service Account credentials")
+# Headless deployments (and the load-testing harness) can point this at a key
+# file instead of uploading one in the browser.
+credentials_path = os.environ.get("DRIVE_MANAGER_CREDENTIALS")
 
-if not json_file:
+json_file = None
+if not credentials_path:
+    json_file = st.sidebar.file_uploader("Service Account JSON", type=["json"], help="Upload your Google Service Account credentials")
+
+if not credentials_path and not json_file:
     st.markdown("""
     <div class="main-header">
         <h1>📁 Google Drive Business Manager Pro</h1>
@@ -137,7 +148,11 @@ if not json_file:
 
 # Parse JSON
 try:
-    service_info = json.load(json_file)
+    if credentials_path:
+        with open(credentials_path) as f:
+            service_info = json.load(f)
+    else:
+        service_info = json.load(json_file)
     st.sidebar.success("✅ Credentials loaded")
 except Exception as e:
     st.sidebar.error("❌ Invalid JSON file")
@@ -147,133 +162,60 @@ except Exception as e:
 try:
     credentials = service_account.Credentials.from_service_account_info(
         service_info,
-        scopes=['https://www.googleapis.com/auth/drive']
+        scopes=DRIVE_SCOPES
     )
-    drive_service = build("drive", "v3", credentials=credentials)
+    drive_service = build_service(credentials)
     st.sidebar.success("✅ Connected to Google Drive")
 except Exception as e:
     st.sidebar.error(f"❌ Authentication failed: {str(e)}")
     st.stop()
 
 # ---------------------------------------
-# FOLDER CONFIGURATION
+# FOLDER SYSTEM, LISTING CACHE & JOB QUEUE
 # ---------------------------------------
-MAIN_FOLDER_NAME = "Business Main Folder"
-
-SUBFOLDERS = {
-    "001 Administration": {
-        "icon": "🏢",
-        "description": "Documents, policies, HR files, internal records, company handbook",
-        "color": "#667eea"
-    },
-    "002 Financial": {
-        "icon": "💰",
-        "description": "Invoices, receipts, taxes, payroll, banking, financial statements",
-        "color": "#f5576c"
-    },
-    "003 Marketing": {
-        "icon": "📢",
-        "description": "Ads, branding, media assets, campaigns, social media content",
-        "color": "#f093fb"
-    },
-    "004 Operation": {
-        "icon": "⚙️",
-        "description": "Systems, SOPs, procedures, workflows, operational guidelines",
-        "color": "#4facfe"
-    },
-    "005 Sale": {
-        "icon": "💼",
-        "description": "Sales scripts, leads, customer files, proposals, contracts",
-        "color": "#43e97b"
-    },
-    "006 Legal": {
-        "icon": "⚖️",
-        "description": "Contracts, licenses, agreements, legal documents, compliance",
-        "color": "#fa709a"
-    },
-    "007 To be file": {
-        "icon": "📋",
-        "description": "Unsorted files to be organized later, temporary storage",
-        "color": "#feca57"
-    }
-}
+@st.cache_resource
+def get_listing_cache():
+    return ListingCache()
 
-# ---------------------------------------
-# HELPER FUNCTIONS
-# ---------------------------------------
-def find_folder_id(name, parent=None):
-    query = f"name = '{name}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-    if parent:
-        query += f" and '{parent}' in parents"
-    results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-    items = results.get("files", [])
-    return items[0]["id"] if items else None
-
-def create_folder(name, parent=None):
-    existing_id = find_folder_id(name, parent)
-    if existing_id:
-        return existing_id
-    metadata = {
-        "name": name,
-        "mimeType": "application/vnd.google-apps.folder"
-    }
-    if parent:
-        metadata["parents"] = [parent]
-    folder = drive_service.files().create(body=metadata, fields="id").execute()
-    return folder.get("id")
+@st.cache_resource
+def get_search_cache():
+    return SearchCache()
 
-def list_files(folder_id, include_folders=True):
-    query = f"'{folder_id}' in parents and trashed = false"
-    if not include_folders:
-        query += " and mimeType != 'application/vnd.google-apps.folder'"
-    
-    results = drive_service.files().list(
-        q=query,
-        fields="files(id, name, mimeType, size, createdTime, modifiedTime, webViewLink, iconLink)",
-        orderBy="name"
-    ).execute()
-    return results.get("files", [])
+@st.cache_resource
+def get_job_queue():
+    queue = JobQueue()
+    cache = get_listing_cache()
 
-def get_folder_stats(folder_id):
-    files = list_files(folder_id, include_folders=False)
-    total_size = sum(int(f.get('size', 0)) for f in files if f.get('size'))
-    return {
-        "file_count": len(files),
-        "total_size": total_size,
-        "total_size_mb": round(total_size / (1024 * 1024), 2)
-    }
+    searches = get_search_cache()
 
-def delete_file(file_id):
-    drive_service.files().delete(fileId=file_id).execute()
+    def on_item_done(kind, account, payload):
+        # Show restored files straight away rather than after the next
+        # changes-feed poll.
+        if kind == "restore":
+            cache.invalidate(account)
+        searches.invalidate(account)
 
-def search_files(query_text):
-    query = f"name contains '{query_text}' and trashed = false"
-    results = drive_service.files().list(
-        q=query,
-        fields="files(id, name, mimeType, webViewLink, parents)",
-        pageSize=50
-    ).execute()
-    return results.get("files", [])
-
-def get_file_icon(mime_type):
-    icons = {
-        "application/pdf": "📄",
-        "application/vnd.google-apps.document": "📝",
-        "application/vnd.google-apps.spreadsheet": "📊",
-        "application/vnd.google-apps.presentation": "📽️",
-        "application/vnd.google-apps.folder": "📁",
-        "image/": "🖼️",
-        "video/": "🎥",
-        "audio/": "🎵"
-    }
-    for key, icon in icons.items():
-        if mime_type.startswith(key):
-            return icon
-    return "📎"
+    queue.add_listener(on_item_done)
+    queue.start()
+    return queue
 
 # Initialize folder system
-main_folder_id = create_folder(MAIN_FOLDER_NAME)
-folder_map = {name: create_folder(name, main_folder_id) for name in SUBFOLDERS.keys()}
+main_folder_id, folder_map = init_folder_map(drive_service)
+
+account = service_info.get('client_email', 'Unknown')
+listing_cache = get_listing_cache()
+search_cache = get_search_cache()
+job_queue = get_job_queue()
+job_queue.register_account(account, lambda: build_service(credentials))
+
+def list_files(folder_id, include_folders=True):
+    return listing_cache.list_files(drive_service, account, folder_id, include_folders)
+
+def get_folder_stats(folder_id):
+    return listing_cache.folder_stats(drive_service, account, folder_id)
+
+def search_files(query_text):
+    return search_cache.search(drive_service, account, query_text)
 
 # ---------------------------------------
 # SESSION STATE
@@ -453,34 +395,26 @@ elif page == "📤 Upload Center":
             st.write(f"**{len(uploaded_files)} file(s) ready to upload**")
             
             if st.button("🚀 Upload All Files", type="primary"):
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
+                # Spool the files to disk and hand them to the background
+                # workers so the upload no longer depends on this session.
+                spool_dir = job_queue.new_spool_dir()
+                items = []
                 for idx, uploaded_file in enumerate(uploaded_files):
-                    status_text.text(f"Uploading {uploaded_file.name}...")
-                    
-                    temp_path = os.path.join(tempfile.gettempdir(), uploaded_file.name)
-                    with open(temp_path, "wb") as f:
+                    spool_path = os.path.join(spool_dir, f"{idx:05d}_{uploaded_file.name}")
+                    with open(spool_path, "wb") as f:
                         f.write(uploaded_file.read())
-                    
-                    media = MediaFileUpload(temp_path, resumable=True)
-                    metadata = {
+                    items.append((uploaded_file.name, {
+                        "path": spool_path,
                         "name": uploaded_file.name,
-                        "parents": [folder_map[target_folder]]
-                    }
-                    
-                    drive_service.files().create(
-                        body=metadata,
-                        media_body=media,
-                        fields="id"
-                    ).execute()
-                    
-                    os.remove(temp_path)
-                    progress_bar.progress((idx + 1) / len(uploaded_files))
-                
-                status_text.empty()
-                progress_bar.empty()
-                st.success(f"✅ Successfully uploaded {len(uploaded_files)} file(s) to **{target_folder}**")
+                        "parent": folder_map[target_folder]
+                    }))
+
+                job_id = job_queue.submit(
+                    "upload", account,
+                    f"Upload {len(items)} file(s) to {target_folder}",
+                    items, spool_dir=spool_dir
+                )
+                st.success(f"✅ Queued {len(items)} file(s) for **{target_folder}** as job #{job_id}. Track progress on the 🧵 Jobs page.")
     
     with col2:
         st.subheader("📊 Upload Statistics")
@@ -524,38 +458,40 @@ elif page == "📄 File Browser":
         
         if view_mode == "Detailed List":
             for file in files:
-                icon = get_file_icon(file['mimeType'])
-                size = round(int(file.get('size', 0)) / 1024, 1) if file.get('size') else 'N/A'
-                modified = file.get('modifiedTime', 'Unknown')[:10]
+                icon = get_file_icon(file.mime_type)
+                size = round(file.size / 1024, 1) if file.size is not None else 'N/A'
+                modified = file.modified_date
                 
                 col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
                 
                 with col1:
-                    st.write(f"{icon} **{file['name']}**")
+                    st.write(f"{icon} **{file.name}**")
                 with col2:
                     st.write(f"{size} KB")
                 with col3:
                     st.write(modified)
                 with col4:
-                    if st.button("🗑️", key=f"del_{file['id']}", help="Delete file"):
-                        delete_file(file['id'])
+                    if st.button("🗑️", key=f"del_{file.id}", help="Delete file"):
+                        delete_file(drive_service, file.id)
+                        listing_cache.invalidate(account, folder_map[selected_folder])
+                        search_cache.invalidate(account)
                         st.rerun()
                 
-                st.markdown(f"[Open in Drive]({file['webViewLink']})")
+                st.markdown(f"[Open in Drive]({file.web_view_link})")
                 st.markdown("---")
         
         else:  # Grid View
             cols = st.columns(3)
             for idx, file in enumerate(files):
                 with cols[idx % 3]:
-                    icon = get_file_icon(file['mimeType'])
+                    icon = get_file_icon(file.mime_type)
                     st.markdown(f"""
                     <div class="file-item" style="text-align: center;">
                         <h2>{icon}</h2>
-                        <p><strong>{file['name'][:20]}...</strong></p>
+                        <p><strong>{file.name[:20]}...</strong></p>
                     </div>
                     """, unsafe_allow_html=True)
-                    st.link_button("Open", file['webViewLink'], key=f"open_{file['id']}")
+                    st.link_button("Open", file.web_view_link, key=f"open_{file.id}")
 
 # ===================================================================
 # 🔍 SEARCH FILES PAGE
@@ -577,24 +513,24 @@ elif page == "🔍 Search Files":
             st.success(f"Found {len(results)} file(s) matching '{search_query}'")
             
             for file in results:
-                icon = get_file_icon(file['mimeType'])
+                icon = get_file_icon(file.mime_type)
                 
                 # Find which folder it belongs to
                 parent_folder = "Unknown"
-                if file.get('parents'):
+                if file.parent:
                     for fname, fid in folder_map.items():
-                        if fid in file['parents']:
+                        if fid == file.parent:
                             parent_folder = fname
                             break
                 
                 st.markdown(f"""
                 <div class="file-item">
-                    <h4>{icon} {file['name']}</h4>
+                    <h4>{icon} {file.name}</h4>
                     <p>📁 Location: {parent_folder}</p>
                 </div>
                 """, unsafe_allow_html=True)
                 
-                st.link_button("Open File", file['webViewLink'], key=f"search_{file['id']}")
+                st.link_button("Open File", file.web_view_link, key=f"search_{file.id}")
                 st.markdown("---")
 
 # ===================================================================
@@ -706,6 +642,8 @@ elif page == "⚙️ Settings":
     st.subheader("System Actions")
     
     if st.button("🔄 Refresh Folder Structure"):
+        listing_cache.invalidate(account)
+        search_cache.invalidate(account)
         st.rerun()
     
     st.warning("⚠️ Danger Zone")
@@ -723,19 +661,23 @@ elif page == "🗑️ Trash Manager":
     st.info("View and manage recently deleted files")
     
     try:
-        results = drive_service.files().list(
-            q="trashed = true",
-            fields="files(id, name, trashedTime, mimeType)",
-            pageSize=50
-        ).execute()
-        
-        trashed_files = results.get("files", [])
+        trashed_files = list_trashed_files(drive_service)
         
         if not trashed_files:
             st.success("✅ Trash is empty!")
         else:
             st.warning(f"Found {len(trashed_files)} file(s) in trash")
             
+            if st.button("♻️ Restore All"):
+                job_id = job_queue.submit(
+                    "restore", account,
+                    f"Restore {len(trashed_files)} file(s) from trash",
+                    [(file['name'], {"file_id": file['id']}) for file in trashed_files]
+                )
+                st.success(f"Queued restore of {len(trashed_files)} file(s) as job #{job_id}")
+            
+            st.markdown("---")
+            
             for file in trashed_files:
                 col1, col2 = st.columns([3, 1])
                 with col1:
@@ -744,10 +686,9 @@ elif page == "🗑️ Trash Manager":
                     st.caption(f"Deleted: {file.get('trashedTime', 'Unknown')[:10]}")
                 with col2:
                     if st.button("Restore", key=f"restore_{file['id']}"):
-                        drive_service.files().update(
-                            fileId=file['id'],
-                            body={'trashed': False}
-                        ).execute()
+                        restore_file(drive_service, file['id'])
+                        listing_cache.invalidate(account)
+                        search_cache.invalidate(account)
                         st.success(f"Restored {file['name']}")
                         st.rerun()
                 
@@ -755,3 +696,63 @@ elif page == "🗑️ Trash Manager":
     
     except Exception as e:
         st.error(f"Error accessing trash: {str(e)}")
+
+# ===================================================================
+# 🧵 JOBS PAGE
+# ===================================================================
+elif page == "🧵 Jobs":
+    st.title("🧵 Background Jobs")
+    
+    st.write("Uploads and bulk operations run in the background and keep going if you leave this page.")
+    
+    if st.button("🔄 Refresh"):
+        st.rerun()
+    
+    jobs = job_queue.list_jobs(account)
+    
+    if not jobs:
+        st.info("No jobs yet. Uploads from the Upload Center will appear here.")
+    
+    status_icons = {
+        "queued": "⏳",
+        "running": "🔄",
+        "completed": "✅",
+        "failed": "❌",
+        "cancelled": "🚫"
+    }
+    
+    for job in jobs:
+        finished = job['done'] + job['failed']
+        created = datetime.fromtimestamp(job['created_at']).strftime("%Y-%m-%d %H:%M")
+        
+        st.markdown(f"**{status_icons.get(job['status'], '•')} #{job['id']} {job['title']}**")
+        st.progress(finished / job['total'] if job['total'] else 1.0)
+        st.caption(f"{job['status'].title()} | {job['done']}/{job['total']} done | {job['failed']} failed | Created {created}")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if job['status'] not in FINISHED_STATUSES:
+                if st.button("Cancel", key=f"job_cancel_{job['id']}"):
+                    job_queue.cancel(job['id'])
+                    st.rerun()
+        with col2:
+            if job['status'] in ("failed", "cancelled"):
+                if st.button("Retry", key=f"job_retry_{job['id']}"):
+                    job_queue.retry(job['id'])
+                    st.rerun()
+        with col3:
+            if job['status'] in FINISHED_STATUSES:
+                if st.button("Remove", key=f"job_remove_{job['id']}"):
+                    job_queue.remove(job['id'])
+                    st.rerun()
+        
+        with st.expander("Item details"):
+            items = job_queue.get_items(job['id'])
+            st.dataframe(pd.DataFrame([{
+                "Item": item['label'],
+                "Status": item['status'],
+                "Attempts": item['attempts'],
+                "Error": item['error'] or ""
+            } for item in items]), use_container_width=True)
+        
+        st.markdown("---")
@@ -0,0 +1,220 @@
+import os
+
+from googleapiclient import discovery
+from googleapiclient.http import MediaFileUpload
+
+DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive']
+
+# Local state (job queue, spooled uploads, sync caches) lives here.
+DATA_DIR = os.environ.get("DRIVE_MANAGER_DATA_DIR", os.path.join(os.path.expanduser("~"), ".drive_manager"))
+
+# Files above this size are sent with a resumable upload; smaller ones go up
+# in a single request, which matters when syncing many small files.
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+
+# ---------------------------------------
+# FOLDER CONFIGURATION
+# ---------------------------------------
+MAIN_FOLDER_NAME = "Business Main Folder"
+
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+SUBFOLDERS = {
+    "001 Administration": {
+        "icon": "🏢",
+        "description": "Documents, policies, HR files, internal records, company handbook",
+        "color": "#667eea"
+    },
+    "002 Financial": {
+        "icon": "💰",
+        "description": "Invoices, receipts, taxes, payroll, banking, financial statements",
+        "color": "#f5576c"
+    },
+    "003 Marketing": {
+        "icon": "📢",
+        "description": "Ads, branding, media assets, campaigns, social media content",
+        "color": "#f093fb"
+    },
+    "004 Operation": {
+        "icon": "⚙️",
+        "description": "Systems, SOPs, procedures, workflows, operational guidelines",
+        "color": "#4facfe"
+    },
+    "005 Sale": {
+        "icon": "💼",
+        "description": "Sales scripts, leads, customer files, proposals, contracts",
+        "color": "#43e97b"
+    },
+    "006 Legal": {
+        "icon": "⚖️",
+        "description": "Contracts, licenses, agreements, legal documents, compliance",
+        "color": "#fa709a"
+    },
+    "007 To be file": {
+        "icon": "📋",
+        "description": "Unsorted files to be organized later, temporary storage",
+        "color": "#feca57"
+    }
+}
+
+# ---------------------------------------
+# HELPER FUNCTIONS
+# ---------------------------------------
+# Every helper takes the Drive service explicitly so the same code paths can
+# be used from the Streamlit app, the background job workers and scripts.
+
+def build_service(credentials):
+    return discovery.build("drive", "v3", credentials=credentials)
+
+def escape_query(value):
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+def find_folder_id(service, name, parent=None):
+    query = f"name = '{escape_query(name)}' and mimeType = '{FOLDER_MIME_TYPE}' and trashed = false"
+    if parent:
+        query += f" and '{parent}' in parents"
+    results = service.files().list(q=query, fields="files(id, name)").execute()
+    items = results.get("files", [])
+    return items[0]["id"] if items else None
+
+def create_folder(service, name, parent=None):
+    existing_id = find_folder_id(service, name, parent)
+    if existing_id:
+        return existing_id
+    metadata = {
+        "name": name,
+        "mimeType": FOLDER_MIME_TYPE
+    }
+    if parent:
+        metadata["parents"] = [parent]
+    folder = service.files().create(body=metadata, fields="id").execute()
+    return folder.get("id")
+
+def init_folder_map(service):
+    main_folder_id = create_folder(service, MAIN_FOLDER_NAME)
+    folder_map = {name: create_folder(service, name, main_folder_id) for name in SUBFOLDERS.keys()}
+    return main_folder_id, folder_map
+
+def iter_all_files(service, query, fields, order_by=None, page_size=1000):
+    """Yield every file matching ``query``, following ``nextPageToken``."""
+    page_token = None
+    while True:
+        params = {
+            "q": query,
+            "fields": f"nextPageToken, files({fields})",
+            "pageSize": page_size
+        }
+        if order_by:
+            params["orderBy"] = order_by
+        if page_token:
+            params["pageToken"] = page_token
+        results = service.files().list(**params).execute()
+        yield from results.get("files", [])
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return
+
+FILE_FIELDS = "id, name, mimeType, size, createdTime, modifiedTime"
+
+def list_files(service, folder_id, include_folders=True):
+    query = f"'{folder_id}' in parents and trashed = false"
+    if not include_folders:
+        query += f" and mimeType != '{FOLDER_MIME_TYPE}'"
+    return list(iter_all_files(service, query, FILE_FIELDS, order_by="name"))
+
+def get_start_page_token(service):
+    return service.changes().getStartPageToken().execute()["startPageToken"]
+
+def list_changes(service, page_token):
+    """Return ``(changes, new_start_page_token)`` for everything since ``page_token``."""
+    changes = []
+    while True:
+        results = service.changes().list(
+            pageToken=page_token,
+            fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}, parents, trashed))",
+            pageSize=1000,
+            spaces="drive"
+        ).execute()
+        changes.extend(results.get("changes", []))
+        if "newStartPageToken" in results:
+            return changes, results["newStartPageToken"]
+        page_token = results["nextPageToken"]
+
+def delete_file(service, file_id):
+    service.files().delete(fileId=file_id).execute()
+
+def restore_file(service, file_id):
+    service.files().update(fileId=file_id, body={'trashed': False}).execute()
+
+def _media(path):
+    return MediaFileUpload(path, resumable=os.path.getsize(path) > RESUMABLE_THRESHOLD)
+
+def upload_file(service, path, name, parent_id, modified_time=None, app_properties=None):
+    metadata = {
+        "name": name,
+        "parents": [parent_id]
+    }
+    if modified_time:
+        metadata["modifiedTime"] = modified_time
+    if app_properties:
+        metadata["appProperties"] = app_properties
+    return service.files().create(
+        body=metadata,
+        media_body=_media(path),
+        fields="id"
+    ).execute()
+
+def find_file_by_property(service, parent_id, key, value):
+    query = (f"'{parent_id}' in parents and trashed = false and "
+             f"appProperties has {{ key='{escape_query(key)}' and value='{escape_query(value)}' }}")
+    results = service.files().list(q=query, fields="files(id)", pageSize=1).execute()
+    items = results.get("files", [])
+    return items[0]["id"] if items else None
+
+def update_file_content(service, file_id, path, modified_time=None):
+    metadata = {"modifiedTime": modified_time} if modified_time else {}
+    return service.files().update(
+        fileId=file_id,
+        body=metadata,
+        media_body=_media(path),
+        fields="id"
+    ).execute()
+
+def set_modified_time(service, file_id, modified_time):
+    service.files().update(fileId=file_id, body={"modifiedTime": modified_time}, fields="id").execute()
+
+def trash_file(service, file_id):
+    service.files().update(fileId=file_id, body={'trashed': True}).execute()
+
+def search_files(service, query_text):
+    query = f"name contains '{escape_query(query_text)}' and trashed = false"
+    results = service.files().list(
+        q=query,
+        fields="files(id, name, mimeType, parents)",
+        pageSize=50
+    ).execute()
+    return results.get("files", [])
+
+def list_trashed_files(service):
+    results = service.files().list(
+        q="trashed = true",
+        fields="files(id, name, trashedTime, mimeType)",
+        pageSize=50
+    ).execute()
+    return results.get("files", [])
+
+def get_file_icon(mime_type):
+    icons = {
+        "application/pdf": "📄",
+        "application/vnd.google-apps.document": "📝",
+        "application/vnd.google-apps.spreadsheet": "📊",
+        "application/vnd.google-apps.presentation": "📽️",
+        "application/vnd.google-apps.folder": "📁",
+        "image/": "🖼️",
+        "video/": "🎥",
+        "audio/": "🎵"
+    }
+    for key, icon in icons.items():
+        if mime_type.startswith(key):
+            return icon
+    return "📎"
@@ -0,0 +1,390 @@
+"""Headless rsync-style sync of a local directory into the business folder tree.
+
+Example::
+
+    python drive_sync.py --credentials service_account.json \\
+        /srv/scans/receipts "002 Financial" --dest Receipts/2024 --workers 16
+
+Local files are compared with the Drive copy by size and modification time,
+falling back to MD5 only when those disagree. Local MD5s are cached between
+runs, so an unchanged tree is never re-hashed.
+"""
+import argparse
+import fnmatch
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from google.oauth2 import service_account
+
+from drive_helpers import (
+    DATA_DIR, DRIVE_SCOPES, FOLDER_MIME_TYPE, MAIN_FOLDER_NAME, SUBFOLDERS, build_service, create_folder,
+    find_folder_id, init_folder_map, iter_all_files, set_modified_time, trash_file, update_file_content,
+    upload_file
+)
+
+HASH_CACHE_PATH = os.path.join(DATA_DIR, "sync_hashes.db")
+REMOTE_FIELDS = "id, name, mimeType, size, modifiedTime, md5Checksum"
+HASH_CHUNK_SIZE = 1024 * 1024
+# Hashes are committed in batches so an interrupted run keeps most of its work.
+HASH_COMMIT_EVERY = 200
+
+# ---------------------------------------
+# TIME & HASH HELPERS
+# ---------------------------------------
+# Drive keeps modification times to the millisecond, so both sides are
+# compared as integer milliseconds.
+def ns_to_ms(mtime_ns):
+    return mtime_ns // 1_000_000
+
+def ms_to_rfc3339(ms):
+    stamp = datetime.fromtimestamp(ms // 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+    return f"{stamp}.{ms % 1000:03d}Z"
+
+def rfc3339_to_ms(value):
+    stamp, _, fraction = value.rstrip("Z").partition(".")
+    seconds = datetime.strptime(stamp, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    return int(seconds) * 1000 + int((fraction + "000")[:3])
+
+def file_md5(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class HashCache:
+    """Local MD5s keyed by absolute path and invalidated by size/mtime."""
+
+    def __init__(self, path=HASH_CACHE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS hashes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, md5 TEXT)"
+        )
+        self._lock = threading.Lock()
+        self._uncommitted = 0
+
+    def md5(self, path, size, mtime_ns):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT md5 FROM hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, size, mtime_ns)
+            ).fetchone()
+        if row:
+            return row[0]
+        digest = file_md5(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, md5) VALUES (?, ?, ?, ?)",
+                (path, size, mtime_ns, digest)
+            )
+            self._uncommitted += 1
+            if self._uncommitted >= HASH_COMMIT_EVERY:
+                self._conn.commit()
+                self._uncommitted = 0
+        return digest
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+# ---------------------------------------
+# TREE SCANNING
+# ---------------------------------------
+def is_excluded(relpath, patterns):
+    name = os.path.basename(relpath)
+    return any(fnmatch.fnmatch(relpath, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+def scan_local(root, excludes):
+    """Return ``(dirs, files, errors)`` keyed by '/'-separated paths relative to
+    ``root``. ``errors`` maps paths that could not be read (a broken symlink,
+    an unreadable directory) to the error."""
+    dirs = set()
+    files = {}
+    errors = {}
+
+    def relative(path):
+        return os.path.relpath(path, root).replace(os.sep, "/")
+
+    def walk_error(e):
+        errors[relative(e.filename)] = e
+
+    for dirpath, dirnames, filenames in os.walk(root, onerror=walk_error):
+        rel_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        rel_dir = "" if rel_dir == "." else rel_dir
+        dirnames[:] = [d for d in dirnames if not is_excluded(f"{rel_dir}/{d}".lstrip("/"), excludes)]
+        for d in dirnames:
+            dirs.add(f"{rel_dir}/{d}".lstrip("/"))
+        for name in filenames:
+            relpath = f"{rel_dir}/{name}".lstrip("/")
+            if is_excluded(relpath, excludes):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                errors[relpath] = e
+                continue
+            files[relpath] = {"path": path, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    return dirs, files, errors
+
+def scan_remote(pool, service_for, root_id, excludes=()):
+    """List the Drive tree under ``root_id``, one folder per worker at a time.
+
+    Excluded paths are left out entirely, as in ``scan_local``, so they are
+    never compared, uploaded over or trashed by ``--delete``.
+    """
+    dirs = {"": root_id}
+    files = {}
+
+    def list_folder(rel_dir, folder_id):
+        query = f"'{folder_id}' in parents and trashed = false"
+        return rel_dir, list(iter_all_files(service_for(), query, REMOTE_FIELDS))
+
+    pending = {pool.submit(list_folder, "", root_id)}
+    while pending:
+        future = next(as_completed(pending))
+        pending.remove(future)
+        rel_dir, children = future.result()
+        for child in children:
+            relpath = f"{rel_dir}/{child['name']}".lstrip("/")
+            if is_excluded(relpath, excludes):
+                continue
+            if child["mimeType"] == FOLDER_MIME_TYPE:
+                if relpath not in dirs:
+                    dirs[relpath] = child["id"]
+                    pending.add(pool.submit(list_folder, relpath, child["id"]))
+            elif relpath not in files:
+                files[relpath] = child
+    return dirs, files
+
+# ---------------------------------------
+# SYNC
+# ---------------------------------------
+class SyncStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counts = {"scanned": 0, "uploaded": 0, "updated": 0, "touched": 0, "unchanged": 0,
+                       "skipped": 0, "deleted": 0, "folders": 0, "failed": 0}
+        self.bytes = 0
+
+    def add(self, key, nbytes=0):
+        with self.lock:
+            self.counts[key] += 1
+            self.bytes += nbytes
+
+    def report(self):
+        elapsed = max(time.time() - self.started, 1e-6)
+        c = self.counts
+        transferred = c["uploaded"] + c["updated"]
+        lines = [
+            f"Scanned {c['scanned']} local file(s) in {elapsed:.1f}s",
+            f"  uploaded {c['uploaded']}, updated {c['updated']}, timestamps fixed {c['touched']}, "
+            f"unchanged {c['unchanged']}, skipped {c['skipped']}",
+            f"  folders created {c['folders']}, deleted {c['deleted']}, failed {c['failed']}",
+            f"  transferred {round(self.bytes / (1024 * 1024), 2)} MB "
+            f"({round(self.bytes / (1024 * 1024) / elapsed, 2)} MB/s, {round(transferred / elapsed, 1)} files/s, "
+            f"{round(c['scanned'] / elapsed, 1)} files/s scanned)",
+        ]
+        return "\n".join(lines)
+
+def plan_file(local, remote, hashes):
+    """Decide what to do with one local file: upload, update, touch or skip."""
+    if remote is None:
+        return "upload"
+    if "md5Checksum" not in remote:
+        # Google Docs and other native files cannot be overwritten by a sync.
+        return "skip"
+    if int(remote.get("size", -1)) != local["size"]:
+        return "update"
+    if rfc3339_to_ms(remote["modifiedTime"]) == ns_to_ms(local["mtime_ns"]):
+        return "unchanged"
+    if hashes.md5(local["path"], local["size"], local["mtime_ns"]) == remote["md5Checksum"]:
+        return "touch"
+    return "update"
+
+def run_sync(credentials, source, folder, dest="", delete=False, dry_run=False, workers=8,
+             excludes=(), log=print):
+    local_root = os.path.abspath(source)
+    if not os.path.isdir(local_root):
+        raise ValueError(f"Not a directory: {source}")
+
+    local_state = threading.local()
+
+    def service_for():
+        if not hasattr(local_state, "service"):
+            local_state.service = build_service(credentials)
+        return local_state.service
+
+    stats = SyncStats()
+    hashes = HashCache()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            if dry_run:
+                # Look the folders up without creating anything.
+                main_folder_id = find_folder_id(service_for(), MAIN_FOLDER_NAME)
+                root_id = main_folder_id and find_folder_id(service_for(), folder, main_folder_id)
+            else:
+                _, folder_map = init_folder_map(service_for())
+                root_id = folder_map[folder]
+            for part in [p for p in dest.split("/") if p]:
+                if dry_run:
+                    root_id = root_id and find_folder_id(service_for(), part, root_id)
+                else:
+                    root_id = create_folder(service_for(), part, root_id)
+
+            local_dirs, local_files, local_errors = scan_local(local_root, excludes)
+            if root_id:
+                remote_dirs, remote_files = scan_remote(pool, service_for, root_id, excludes)
+            else:
+                remote_dirs, remote_files = {"": None}, {}
+            stats.counts["scanned"] = len(local_files) + len(local_errors)
+            log(f"Local: {len(local_files)} file(s) in {len(local_dirs)} folder(s); "
+                f"Drive: {len(remote_files)} file(s) in {len(remote_dirs) - 1} folder(s)")
+            for relpath, e in sorted(local_errors.items()):
+                stats.add("failed")
+                log(f"error  {relpath}: {e}")
+
+            # Create missing folders level by level so parents always exist first.
+            missing = sorted(d for d in local_dirs if d not in remote_dirs)
+            by_depth = {}
+            for relpath in missing:
+                by_depth.setdefault(relpath.count("/"), []).append(relpath)
+
+            # Folders that could not be created, with everything beneath them.
+            failed_dirs = set()
+
+            def make_folder(relpath):
+                parent_rel, _, name = relpath.rpartition("/")
+                if dry_run:
+                    return relpath, None
+                return relpath, create_folder(service_for(), name, remote_dirs[parent_rel])
+
+            for depth in sorted(by_depth):
+                todo = []
+                for relpath in by_depth[depth]:
+                    if relpath.rpartition("/")[0] in failed_dirs:
+                        failed_dirs.add(relpath)
+                    else:
+                        todo.append(relpath)
+                futures = {pool.submit(make_folder, relpath): relpath for relpath in todo}
+                for future in as_completed(futures):
+                    try:
+                        relpath, folder_id = future.result()
+                    except Exception as e:
+                        failed_dirs.add(futures[future])
+                        stats.add("failed")
+                        log(f"error  {futures[future]}/: {e}")
+                        continue
+                    log(f"mkdir  {relpath}")
+                    remote_dirs[relpath] = folder_id
+                    stats.add("folders")
+
+            def sync_one(relpath):
+                local = local_files[relpath]
+                remote = remote_files.get(relpath)
+                action = plan_file(local, remote, hashes)
+                modified = ms_to_rfc3339(ns_to_ms(local["mtime_ns"]))
+                if action in ("unchanged", "skip"):
+                    stats.add("unchanged" if action == "unchanged" else "skipped")
+                    return action, relpath
+                if not dry_run:
+                    if action == "upload":
+                        parent_rel = relpath.rpartition("/")[0]
+                        upload_file(service_for(), local["path"], relpath.rpartition("/")[2],
+                                    remote_dirs[parent_rel], modified_time=modified)
+                    elif action == "update":
+                        update_file_content(service_for(), remote["id"], local["path"], modified_time=modified)
+                    else:
+                        set_modified_time(service_for(), remote["id"], modified)
+                if action == "touch":
+                    stats.add("touched")
+                else:
+                    stats.add("uploaded" if action == "upload" else "updated", local["size"])
+                return action, relpath
+
+            futures = {}
+            for relpath in sorted(local_files):
+                parent_rel = relpath.rpartition("/")[0]
+                if parent_rel in failed_dirs:
+                    stats.add("failed")
+                    log(f"error  {relpath}: folder {parent_rel} could not be created")
+                else:
+                    futures[pool.submit(sync_one, relpath)] = relpath
+            for future in as_completed(futures):
+                try:
+                    action, relpath = future.result()
+                except Exception as e:
+                    stats.add("failed")
+                    log(f"error  {futures[future]}: {e}")
+                    continue
+                if action in ("upload", "update"):
+                    log(f"{action:<6} {relpath}")
+
+            if delete:
+                extra_dirs = [d for d in remote_dirs if d and d not in local_dirs]
+                # Trashing a folder trashes its contents, so skip anything beneath one.
+                doomed_dirs = [d for d in extra_dirs if not any(d.startswith(p + "/") for p in extra_dirs)]
+                doomed_files = [f for f in remote_files if f not in local_files
+                                and not any(f.startswith(d + "/") for d in doomed_dirs)]
+
+                def remove(relpath, file_id):
+                    if not dry_run:
+                        trash_file(service_for(), file_id)
+                    return relpath
+
+                futures = {pool.submit(remove, d, remote_dirs[d]): d for d in doomed_dirs}
+                futures.update({pool.submit(remove, f, remote_files[f]["id"]): f for f in doomed_files})
+                for future in as_completed(futures):
+                    try:
+                        relpath = future.result()
+                    except Exception as e:
+                        stats.add("failed")
+                        log(f"error  {futures[future]}: {e}")
+                        continue
+                    stats.add("deleted")
+                    log(f"trash  {relpath}")
+    finally:
+        hashes.close()
+    return stats
+
+# ---------------------------------------
+# COMMAND LINE
+# ---------------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sync a local directory into a business folder on Google Drive.")
+    parser.add_argument("source", help="Local directory to sync")
+    parser.add_argument("folder", choices=list(SUBFOLDERS.keys()), help="Business folder to sync into")
+    parser.add_argument("--credentials", required=True, help="Path to the service account JSON file")
+    parser.add_argument("--dest", default="", help="Sub-path inside the business folder, e.g. 'Receipts/2024'")
+    parser.add_argument("--delete", action="store_true", help="Move Drive files missing locally to the trash")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would change without touching Drive")
+    parser.add_argument("--workers", type=int, default=8, help="Parallel transfers (default: 8)")
+    parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                        help="Glob of paths or names to skip; may be repeated")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    credentials = service_account.Credentials.from_service_account_file(args.credentials, scopes=DRIVE_SCOPES)
+    try:
+        stats = run_sync(
+            credentials, args.source, args.folder, dest=args.dest, delete=args.delete,
+            dry_run=args.dry_run, workers=args.workers, excludes=args.exclude
+        )
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    print(stats.report())
+    return 1 if stats.counts["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
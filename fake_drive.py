@@ -0,0 +1,261 @@
+"""In-memory stand-in for the Drive v3 ``files`` and ``changes`` APIs, with simulated latency.
+
+Only the calls and query clauses this app issues are supported. Used by the
+load-testing harness (loadtest.py) so runs never touch a real Drive or quota.
+"""
+import itertools
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from drive_helpers import FOLDER_MIME_TYPE
+
+MAX_PAGE_SIZE = 1000
+DEFAULT_PAGE_SIZE = 100
+
+_QUOTED = r"'((?:[^'\\]|\\.)*)'"
+_CLAUSES = [
+    (re.compile(rf"name = {_QUOTED}"), lambda m: ("name", m)),
+    (re.compile(rf"name contains {_QUOTED}"), lambda m: ("name_contains", m)),
+    (re.compile(rf"mimeType = {_QUOTED}"), lambda m: ("mime", m)),
+    (re.compile(rf"mimeType != {_QUOTED}"), lambda m: ("not_mime", m)),
+    (re.compile(rf"{_QUOTED} in parents"), lambda m: ("parent", m)),
+    (re.compile(r"trashed = (true|false)"), lambda m: ("trashed", m)),
+    (re.compile(rf"appProperties has {{ key={_QUOTED} and value={_QUOTED} }}"), lambda m: ("app_property", m)),
+]
+
+def _unescape(value):
+    return re.sub(r"\\(.)", r"\1", value)
+
+def parse_query(q):
+    """Turn a Drive query string into a list of predicates over file dicts."""
+    predicates = []
+    pos = 0
+    while pos < len(q):
+        for pattern, kind in _CLAUSES:
+            m = pattern.match(q, pos)
+            if m:
+                break
+        else:
+            raise ValueError(f"Unsupported query clause at {q[pos:]!r}")
+        name, m = kind(m)
+        if name == "name":
+            value = _unescape(m.group(1))
+            predicates.append(lambda f, v=value: f["name"] == v)
+        elif name == "name_contains":
+            value = _unescape(m.group(1)).lower()
+            predicates.append(lambda f, v=value: v in f["name"].lower())
+        elif name == "mime":
+            predicates.append(lambda f, v=m.group(1): f["mimeType"] == v)
+        elif name == "not_mime":
+            predicates.append(lambda f, v=m.group(1): f["mimeType"] != v)
+        elif name == "parent":
+            predicates.append(lambda f, v=m.group(1): v in f.get("parents", ()))
+        elif name == "app_property":
+            key, value = _unescape(m.group(1)), _unescape(m.group(2))
+            predicates.append(lambda f, k=key, v=value: f.get("appProperties", {}).get(k) == v)
+        else:
+            predicates.append(lambda f, v=(m.group(1) == "true"): f["trashed"] == v)
+        pos = m.end()
+        if q.startswith(" and ", pos):
+            pos += len(" and ")
+    return predicates
+
+def now_rfc3339(offset_seconds=0):
+    stamp = datetime.now(timezone.utc) + timedelta(seconds=offset_seconds)
+    return stamp.strftime("%Y-%m-%dT%H:%M:%S.") + f"{stamp.microsecond // 1000:03d}Z"
+
+
+class FakeDrive:
+    """Thread-safe file store shared by every fake service it hands out."""
+
+    def __init__(self, latency=0.05, jitter=0.02, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.files = {}
+        self.calls = Counter()
+        self.change_log = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+
+    def service(self):
+        return FakeService(self)
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def call_counts(self):
+        with self._lock:
+            return dict(self.calls)
+
+    def call(self, method, kwargs):
+        """Run one API call. Arguments are plain data so this also works through
+        a multiprocessing proxy."""
+        self._count(method)
+        self._sleep()
+        return getattr(self, f"_{method}")(**kwargs)
+
+    def _sleep(self):
+        with self._lock:
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _count(self, method):
+        with self._lock:
+            self.calls[method] += 1
+
+    def add(self, name, parent=None, mime_type="application/octet-stream", size=None,
+            modified_time=None, trashed=False):
+        with self._lock:
+            file_id = f"fake{next(self._ids):08d}"
+            modified_time = modified_time or now_rfc3339()
+            entry = {
+                "id": file_id,
+                "name": name,
+                "mimeType": mime_type,
+                "parents": [parent] if parent else [],
+                "createdTime": modified_time,
+                "modifiedTime": modified_time,
+                "trashed": trashed,
+            }
+            if mime_type != FOLDER_MIME_TYPE and not mime_type.startswith("application/vnd.google-apps."):
+                entry["size"] = str(size or 0)
+                entry["md5Checksum"] = f"{self._random.getrandbits(128):032x}"
+            self.files[file_id] = entry
+            self.change_log.append(file_id)
+            return file_id
+
+    # -- API operations (called through FakeRequest.execute) -------------
+
+    def _list(self, q=None, orderBy=None, pageSize=DEFAULT_PAGE_SIZE, pageToken=None, **_):
+        predicates = parse_query(q) if q else [lambda f: not f["trashed"]]
+        with self._lock:
+            matches = [f for f in self.files.values() if all(p(f) for p in predicates)]
+        if orderBy == "name":
+            matches.sort(key=lambda f: f["name"].lower())
+        page_size = min(pageSize or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        start = int(pageToken or 0)
+        result = {"files": [dict(f) for f in matches[start:start + page_size]]}
+        if start + page_size < len(matches):
+            result["nextPageToken"] = str(start + page_size)
+        return result
+
+    def _create(self, body, media_size=None, **_):
+        file_id = self.add(
+            body["name"],
+            parent=(body.get("parents") or [None])[0],
+            mime_type=body.get("mimeType", "application/octet-stream"),
+            size=media_size,
+            modified_time=body.get("modifiedTime"),
+        )
+        if body.get("appProperties"):
+            with self._lock:
+                self.files[file_id]["appProperties"] = dict(body["appProperties"])
+        return {"id": file_id}
+
+    def _update(self, fileId, body=None, media_size=None, **_):
+        with self._lock:
+            entry = self.files[fileId]
+            entry.update(body or {})
+            if media_size is not None:
+                entry["size"] = str(media_size)
+            if "modifiedTime" not in (body or {}):
+                entry["modifiedTime"] = now_rfc3339()
+            self.change_log.append(fileId)
+        return {"id": fileId}
+
+    def _delete(self, fileId, **_):
+        with self._lock:
+            self.files.pop(fileId, None)
+            self.change_log.append(fileId)
+        return {}
+
+    def _get(self, fileId, **_):
+        with self._lock:
+            return dict(self.files[fileId])
+
+    def _getStartPageToken(self, **_):
+        with self._lock:
+            return {"startPageToken": str(len(self.change_log))}
+
+    def _changes_list(self, pageToken, pageSize=DEFAULT_PAGE_SIZE, **_):
+        start = int(pageToken)
+        page_size = min(pageSize or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        with self._lock:
+            file_ids = self.change_log[start:start + page_size]
+            changes = []
+            for file_id in file_ids:
+                entry = self.files.get(file_id)
+                change = {"fileId": file_id, "removed": entry is None}
+                if entry is not None:
+                    change["file"] = dict(entry)
+                changes.append(change)
+            end = start + len(file_ids)
+            result = {"changes": changes}
+            if end < len(self.change_log):
+                result["nextPageToken"] = str(end)
+            else:
+                result["newStartPageToken"] = str(end)
+        return result
+
+
+class FakeRequest:
+    def __init__(self, drive, method, kwargs):
+        self._drive = drive
+        self._method = method
+        self._kwargs = kwargs
+
+    def execute(self, num_retries=0):
+        kwargs = dict(self._kwargs)
+        media = kwargs.pop("media_body", None)
+        if media is not None:
+            kwargs["media_size"] = media.size()
+        return self._drive.call(self._method, kwargs)
+
+
+class FakeFiles:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, **kwargs):
+        return FakeRequest(self._drive, "list", kwargs)
+
+    def create(self, **kwargs):
+        return FakeRequest(self._drive, "create", kwargs)
+
+    def update(self, **kwargs):
+        return FakeRequest(self._drive, "update", kwargs)
+
+    def delete(self, **kwargs):
+        return FakeRequest(self._drive, "delete", kwargs)
+
+    def get(self, **kwargs):
+        return FakeRequest(self._drive, "get", kwargs)
+
+
+class FakeChanges:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def getStartPageToken(self, **kwargs):
+        return FakeRequest(self._drive, "getStartPageToken", kwargs)
+
+    def list(self, **kwargs):
+        return FakeRequest(self._drive, "changes_list", kwargs)
+
+
+class FakeService:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def files(self):
+        return FakeFiles(self._drive)
+
+    def changes(self):
+        return FakeChanges(self._drive)
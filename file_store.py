@@ -0,0 +1,169 @@
+import sys
+from array import array
+from datetime import datetime, timezone
+
+from drive_helpers import FOLDER_MIME_TYPE
+
+# ---------------------------------------
+# COMPACT FILE METADATA
+# ---------------------------------------
+# Listings are shared by every session in the process, so they are stored
+# column by column: sizes and timestamps in typed arrays, MIME types and parent
+# folder ids interned, and links derived from the id instead of kept as
+# strings. Rows are read through lightweight FileRecord views.
+
+UNKNOWN_SIZE = -1
+
+def parse_time(value):
+    """RFC 3339 timestamp from Drive to epoch seconds (0 when missing)."""
+    if not value:
+        return 0
+    return int(datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp())
+
+def _intern(value):
+    return sys.intern(value) if value else ""
+
+
+class FileRecord:
+    """Read-only view of one row of a FileTable."""
+    __slots__ = ("_table", "_idx")
+
+    def __init__(self, table, idx):
+        self._table = table
+        self._idx = idx
+
+    @property
+    def id(self):
+        return self._table.ids[self._idx]
+
+    @property
+    def name(self):
+        return self._table.names[self._idx]
+
+    @property
+    def mime_type(self):
+        return self._table.mime_types[self._idx]
+
+    @property
+    def size(self):
+        """Size in bytes, or None for Google-native files that have none."""
+        size = self._table.sizes[self._idx]
+        return None if size == UNKNOWN_SIZE else size
+
+    @property
+    def created(self):
+        return self._table.created[self._idx]
+
+    @property
+    def modified(self):
+        return self._table.modified[self._idx]
+
+    @property
+    def parent(self):
+        return self._table.parents[self._idx]
+
+    @property
+    def is_folder(self):
+        return self.mime_type == FOLDER_MIME_TYPE
+
+    @property
+    def web_view_link(self):
+        if self.is_folder:
+            return f"https://drive.google.com/drive/folders/{self.id}"
+        return f"https://drive.google.com/open?id={self.id}"
+
+    @property
+    def modified_date(self):
+        if not self.modified:
+            return "Unknown"
+        return datetime.fromtimestamp(self.modified, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class FileTable:
+    """Immutable, columnar list of Drive files.
+
+    Tables are built once from API results and then only read, which is what
+    makes it safe to hand the same instance to every session.
+    """
+    __slots__ = ("ids", "names", "mime_types", "sizes", "created", "modified", "parents",
+                 "_files_only", "_total_size")
+
+    def __init__(self, rows=()):
+        self.ids = []
+        self.names = []
+        self.mime_types = []
+        self.sizes = array("q")
+        self.created = array("q")
+        self.modified = array("q")
+        self.parents = []
+        self._files_only = None
+        self._total_size = None
+        for row in rows:
+            self._append(*row)
+
+    def _append(self, file_id, name, mime_type, size, created, modified, parent):
+        self.ids.append(file_id)
+        self.names.append(name)
+        self.mime_types.append(mime_type)
+        self.sizes.append(size)
+        self.created.append(created)
+        self.modified.append(modified)
+        self.parents.append(parent)
+
+    @staticmethod
+    def row_from_drive(f):
+        parents = f.get("parents")
+        return (
+            f["id"],
+            f["name"],
+            _intern(f.get("mimeType")),
+            int(f["size"]) if f.get("size") else UNKNOWN_SIZE,
+            parse_time(f.get("createdTime")),
+            parse_time(f.get("modifiedTime")),
+            _intern(parents[0]) if parents else ""
+        )
+
+    @classmethod
+    def from_drive(cls, files, parent=None):
+        """Build a table from Drive API dicts, optionally with a known parent id."""
+        rows = (cls.row_from_drive(f) for f in files)
+        if parent:
+            parent = _intern(parent)
+            rows = (row[:6] + (parent,) for row in rows)
+        return cls(rows)
+
+    def _rows(self):
+        return zip(self.ids, self.names, self.mime_types, self.sizes, self.created, self.modified, self.parents)
+
+    def merge(self, files, parent=None, removed=()):
+        """Return a new table with ``files`` (Drive dicts) added or replaced by id
+        and the ids in ``removed`` dropped."""
+        changed = FileTable.from_drive(files, parent)
+        replaced = set(changed.ids) | set(removed)
+        rows = [row for row in self._rows() if row[0] not in replaced]
+        rows.extend(changed._rows())
+        rows.sort(key=lambda row: row[1].lower())
+        return FileTable(rows)
+
+    def without_folders(self):
+        if self._files_only is None:
+            self._files_only = FileTable(row for row in self._rows() if row[2] != FOLDER_MIME_TYPE)
+        return self._files_only
+
+    def total_size(self):
+        if self._total_size is None:
+            self._total_size = sum(size for size in self.sizes if size > 0)
+        return self._total_size
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return (FileRecord(self, idx) for idx in range(len(self.ids)))
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self.ids)
+        if not 0 <= idx < len(self.ids):
+            raise IndexError(idx)
+        return FileRecord(self, idx)
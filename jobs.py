@@ -0,0 +1,442 @@
+import contextlib
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from drive_helpers import DATA_DIR, find_file_by_property, restore_file, upload_file
+
+# ---------------------------------------
+# JOB QUEUE CONFIGURATION
+# ---------------------------------------
+JOB_DB_PATH = os.path.join(DATA_DIR, "jobs.db")
+SPOOL_DIR = os.path.join(DATA_DIR, "spool")
+
+WORKER_COUNT = int(os.environ.get("DRIVE_MANAGER_JOB_WORKERS", "4"))
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 5
+POLL_INTERVAL_SECONDS = 1.0
+
+# A worker holds a lease on the item it is processing and renews it while the
+# handler runs. Items whose lease has run out (their worker process died) are
+# claimed again by any process sharing the database.
+LEASE_SECONDS = 60
+HEARTBEAT_SECONDS = LEASE_SECONDS / 3
+
+log = logging.getLogger(__name__)
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Item statuses
+PENDING = "pending"
+DONE = "done"
+
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    account TEXT NOT NULL,
+    title TEXT NOT NULL,
+    status TEXT NOT NULL,
+    spool_dir TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL REFERENCES jobs(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    available_at REAL NOT NULL DEFAULT 0,
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_items_claim ON job_items (status, available_at, job_id, position);
+CREATE INDEX IF NOT EXISTS jobs_account ON jobs (account, created_at);
+"""
+
+# ---------------------------------------
+# JOB HANDLERS
+# ---------------------------------------
+# A handler receives a Drive service, one item payload and the claimed item
+# (its ``id`` and the ``attempts`` made before this one). Raising marks the
+# item as failed (and schedules an automatic retry while attempts remain).
+
+UPLOAD_PROPERTY = "drive_manager_job_item"
+
+def handle_upload(service, payload, item):
+    # Uploads are tagged with the job item id. If an earlier attempt (an
+    # automatic or manual retry, or a run interrupted by a restart) already
+    # created the file, don't create it twice. The lookup is always made: a
+    # manual retry resets the attempt count.
+    tag = str(item["id"])
+    if not find_file_by_property(service, payload["parent"], UPLOAD_PROPERTY, tag):
+        upload_file(service, payload["path"], payload["name"], payload["parent"],
+                    app_properties={UPLOAD_PROPERTY: tag})
+    if os.path.exists(payload["path"]):
+        os.remove(payload["path"])
+
+def handle_restore(service, payload, item):
+    restore_file(service, payload["file_id"])
+
+HANDLERS = {
+    "upload": handle_upload,
+    "restore": handle_restore,
+}
+
+def _process_alive(pid):
+    if os.name == "nt":
+        # os.kill would terminate the process there; let its leases expire instead.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+# ---------------------------------------
+# PERSISTENT JOB QUEUE
+# ---------------------------------------
+class JobQueue:
+    """SQLite-backed job queue with an in-process worker pool.
+
+    Jobs are split into items that workers claim one at a time, so a job's
+    items are processed in parallel and survive Streamlit reruns, closed
+    browser tabs and (for anything not yet finished) process restarts.
+    """
+
+    def __init__(self, db_path=JOB_DB_PATH, handlers=None, workers=WORKER_COUNT):
+        self.db_path = db_path
+        self.handlers = dict(HANDLERS if handlers is None else handlers)
+        self.worker_count = workers
+        self._accounts = {}
+        self._local = threading.local()
+        self._claim_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._listeners = []
+        # Identifies this queue's leases: host and pid, so a restarted process
+        # can tell its predecessor's items apart, plus a token for this instance.
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(job_items)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE job_items ADD COLUMN owner TEXT")
+                conn.execute("ALTER TABLE job_items ADD COLUMN lease_until REAL NOT NULL DEFAULT 0")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # -- lifecycle ------------------------------------------------------
+
+    def start(self):
+        if self._threads or not self.worker_count:
+            return
+        self._expire_dead_owners()
+        for idx in range(self.worker_count):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _expire_dead_owners(self):
+        """Release at once the leases of processes on this host that are gone,
+        so a restart does not wait for them to run out. Leases held by live
+        processes, or by other hosts, are left to expire on their own."""
+        host = socket.gethostname()
+        with self._connect() as conn:
+            owners = [row[0] for row in conn.execute(
+                "SELECT DISTINCT owner FROM job_items WHERE status = ? AND owner IS NOT NULL", (RUNNING,)
+            )]
+            for owner in owners:
+                owner_host, pid, _ = owner.rsplit(":", 2)
+                if owner_host == host and int(pid) != os.getpid() and not _process_alive(int(pid)):
+                    conn.execute(
+                        "UPDATE job_items SET lease_until = 0 WHERE status = ? AND owner = ?",
+                        (RUNNING, owner)
+                    )
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def register_account(self, account, service_factory):
+        """Make Drive access available to workers for jobs owned by ``account``.
+
+        Credentials are never written to the database; jobs for an account
+        with no registered factory stay queued until a session provides one.
+        """
+        self._accounts[account] = service_factory
+        self._wakeup.set()
+
+    def add_listener(self, listener):
+        """Call ``listener(kind, account, payload)`` after each item succeeds."""
+        self._listeners.append(listener)
+
+    def new_spool_dir(self):
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        return tempfile.mkdtemp(prefix="job-", dir=SPOOL_DIR)
+
+    # -- submission and control -----------------------------------------
+
+    def submit(self, kind, account, title, items, spool_dir=None):
+        """Queue a job. ``items`` is a list of ``(label, payload)`` pairs."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, account, title, status, spool_dir, total, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, account, title, QUEUED, spool_dir, len(items), now, now)
+            )
+            job_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO job_items (job_id, position, label, payload, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, idx, label, json.dumps(payload), PENDING, now)
+                 for idx, (label, payload) in enumerate(items)]
+            )
+        self._wakeup.set()
+        return job_id
+
+    def cancel(self, job_id):
+        """Cancel pending items. Items already being transferred finish first."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            conn.execute(
+                "UPDATE job_items SET status = ?, updated_at = ? "
+                "WHERE job_id = ? AND (status = ? OR (status = ? AND lease_until < ?))",
+                (CANCELLED, now, job_id, PENDING, RUNNING, now)
+            )
+            self._refresh_job(conn, job_id)
+
+    def retry(self, job_id):
+        """Re-queue every failed or cancelled item of a job."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET cancel_requested = 0 WHERE id = ?", (job_id,))
+            conn.execute(
+                "UPDATE job_items SET status = ?, attempts = 0, error = NULL, available_at = 0, updated_at = ? "
+                "WHERE job_id = ? AND status IN (?, ?)",
+                (PENDING, now, job_id, FAILED, CANCELLED)
+            )
+            self._refresh_job(conn, job_id)
+        self._wakeup.set()
+
+    def remove(self, job_id):
+        """Delete a finished job, its items and any spooled files."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT status, spool_dir FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            if row["status"] not in FINISHED_STATUSES:
+                raise ValueError("Only finished jobs can be removed")
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        if row["spool_dir"]:
+            shutil.rmtree(row["spool_dir"], ignore_errors=True)
+
+    # -- monitoring -----------------------------------------------------
+
+    def list_jobs(self, account, limit=50):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE account = ? ORDER BY created_at DESC LIMIT ?",
+                (account, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_items(self, job_id):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, position, label, status, attempts, error, updated_at FROM job_items "
+                "WHERE job_id = ? ORDER BY position",
+                (job_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    # -- workers --------------------------------------------------------
+
+    def _claim(self):
+        accounts = list(self._accounts)
+        if not accounts:
+            return None
+        placeholders = ", ".join("?" for _ in accounts)
+        now = time.time()
+        with self._claim_lock, self._connect() as conn:
+            # Pending items, and running items whose worker's lease ran out.
+            row = conn.execute(
+                "SELECT i.id, i.job_id, i.payload, i.attempts, i.status, j.kind, j.account, j.cancel_requested "
+                "FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE ((i.status = ? AND i.available_at <= ?) OR (i.status = ? AND i.lease_until < ?)) "
+                f"AND j.account IN ({placeholders}) "
+                "ORDER BY i.job_id, i.position LIMIT 1",
+                (PENDING, now, RUNNING, now, *accounts)
+            ).fetchone()
+            if row is None:
+                return None
+            if row["status"] == RUNNING and row["cancel_requested"]:
+                # Abandoned by a dead worker after its job was cancelled.
+                conn.execute(
+                    "UPDATE job_items SET status = ?, owner = NULL, updated_at = ? WHERE id = ?",
+                    (CANCELLED, now, row["id"])
+                )
+                self._refresh_job(conn, row["job_id"])
+                return None
+            claimed = conn.execute(
+                "UPDATE job_items SET status = ?, attempts = attempts + 1, owner = ?, lease_until = ?, "
+                "updated_at = ? WHERE id = ? AND (status = ? OR (status = ? AND lease_until < ?))",
+                (RUNNING, self.owner, now + LEASE_SECONDS, now, row["id"], PENDING, RUNNING, now)
+            ).rowcount
+            if not claimed:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, now, row["job_id"], QUEUED)
+            )
+        return dict(row)
+
+    def _service_for(self, account):
+        services = getattr(self._local, "services", None)
+        if services is None:
+            services = self._local.services = {}
+        if account not in services:
+            services[account] = self._accounts[account]()
+        return services[account]
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                item = self._claim()
+            except sqlite3.Error:
+                log.exception("Could not claim a job item")
+                item = None
+            if item is None:
+                self._wakeup.wait(POLL_INTERVAL_SECONDS)
+                self._wakeup.clear()
+                continue
+            try:
+                service = self._service_for(item["account"])
+                self.handlers[item["kind"]](service, json.loads(item["payload"]), item)
+            except Exception as e:
+                finished = self._finish_item_until_stopped(item, error=str(e))
+            else:
+                finished = self._finish_item_until_stopped(item)
+                if finished:
+                    self._notify(item)
+
+    def _finish_item_until_stopped(self, item, error=None):
+        # The lease is kept alive meanwhile, so no other worker takes the item.
+        while not self._stopping.is_set():
+            try:
+                self._finish_item(item, error)
+                return True
+            except sqlite3.Error:
+                log.exception("Could not record the result of job item %s", item["id"])
+                self._stopping.wait(POLL_INTERVAL_SECONDS)
+        return False
+
+    def _heartbeat_loop(self):
+        while not self._stopping.wait(HEARTBEAT_SECONDS):
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "UPDATE job_items SET lease_until = ? WHERE status = ? AND owner = ?",
+                        (time.time() + LEASE_SECONDS, RUNNING, self.owner)
+                    )
+            except sqlite3.Error:
+                log.exception("Could not renew job item leases")
+
+    def _notify(self, item):
+        payload = json.loads(item["payload"])
+        for listener in self._listeners:
+            try:
+                listener(item["kind"], item["account"], payload)
+            except Exception:
+                pass
+
+    def _finish_item(self, item, error=None):
+        now = time.time()
+        with self._connect() as conn:
+            # Read the flag now rather than at claim time: the job may have been
+            # cancelled while this item was in flight.
+            cancel_requested = conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE id = ?", (item["job_id"],)
+            ).fetchone()[0]
+            if error is None:
+                status, available_at = DONE, 0
+            elif cancel_requested:
+                status, available_at = CANCELLED, 0
+            elif item["attempts"] + 1 < MAX_ATTEMPTS:
+                status, available_at = PENDING, now + RETRY_BACKOFF_SECONDS * (item["attempts"] + 1)
+            else:
+                status, available_at = FAILED, 0
+            # Only while this queue still holds the lease: after it ran out the
+            # item may have been claimed again elsewhere.
+            conn.execute(
+                "UPDATE job_items SET status = ?, error = ?, available_at = ?, owner = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                (status, error, available_at, now, item["id"], RUNNING, self.owner)
+            )
+            self._refresh_job(conn, item["job_id"])
+
+    def _refresh_job(self, conn, job_id):
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status",
+            (job_id,)
+        ).fetchall())
+        if counts.get(PENDING) or counts.get(RUNNING):
+            status = RUNNING if counts.get(RUNNING) or counts.get(DONE) or counts.get(FAILED) else QUEUED
+        elif counts.get(FAILED):
+            status = FAILED
+        elif counts.get(CANCELLED):
+            status = CANCELLED
+        else:
+            status = COMPLETED
+        conn.execute(
+            "UPDATE jobs SET status = ?, done = ?, failed = ?, updated_at = ? WHERE id = ?",
+            (status, counts.get(DONE, 0), counts.get(FAILED, 0), time.time(), job_id)
+        )
@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from drive_helpers import get_start_page_token, list_changes, list_files, search_files
+from file_store import FileTable
+
+# ---------------------------------------
+# LISTING CACHE CONFIGURATION
+# ---------------------------------------
+# How often, at most, the Drive changes feed is polled per account. Within this
+# window cached listings are served without asking Drive at all.
+PROBE_INTERVAL_SECONDS = float(os.environ.get("DRIVE_MANAGER_PROBE_INTERVAL", "5"))
+
+# The changes feed reports additions, edits (including back-dated
+# modifiedTime, as drive_sync sets), moves, trashing and deletion, so this
+# full re-listing is only a safety net against a missed or expired feed.
+FULL_REFRESH_SECONDS = float(os.environ.get("DRIVE_MANAGER_FULL_REFRESH", "3600"))
+
+# Search results are shared for a short while so that several users running
+# the same query, or one user paging through reruns, hit Drive once.
+SEARCH_TTL_SECONDS = float(os.environ.get("DRIVE_MANAGER_SEARCH_TTL", "60"))
+SEARCH_CACHE_SIZE = 256
+
+
+class _Entry:
+    __slots__ = ("lock", "table", "listed_at", "pending")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.table = None
+        self.listed_at = 0.0
+        # Changes that arrived while the entry was busy being listed.
+        self.pending = []
+
+
+class _Cursor:
+    """Position in one account's changes feed."""
+    __slots__ = ("lock", "token", "checked_at")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.token = None
+        self.checked_at = 0.0
+
+
+class ListingCache:
+    """Process-wide cache of folder listings, kept current by the changes feed.
+
+    Each account has one cursor into the Drive changes feed. At most once per
+    probe interval the feed is read from that cursor (a single small request
+    when nothing changed) and every change is applied to the cached folders:
+    files whose parents include a folder are added or replaced, and files that
+    were removed, trashed or moved elsewhere are dropped. Entries are keyed by
+    account so sessions with different credentials never share results.
+
+    Listings are returned as shared, read-only FileTables; callers must not
+    modify them.
+    """
+
+    def __init__(self, probe_interval=PROBE_INTERVAL_SECONDS, full_refresh=FULL_REFRESH_SECONDS):
+        self.probe_interval = probe_interval
+        self.full_refresh = full_refresh
+        self._entries = {}
+        self._cursors = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, account, folder_id):
+        with self._lock:
+            return self._entries.setdefault((account, folder_id), _Entry())
+
+    def _cursor(self, account):
+        with self._lock:
+            return self._cursors.setdefault(account, _Cursor())
+
+    def list_files(self, service, account, folder_id, include_folders=True):
+        table = self._table(service, account, folder_id)
+        return table if include_folders else table.without_folders()
+
+    def folder_stats(self, service, account, folder_id):
+        files = self.list_files(service, account, folder_id, include_folders=False)
+        total_size = files.total_size()
+        return {
+            "file_count": len(files),
+            "total_size": total_size,
+            "total_size_mb": round(total_size / (1024 * 1024), 2)
+        }
+
+    def _table(self, service, account, folder_id):
+        # The cursor is established before any listing so that no change made
+        # after a listing can be missed.
+        self._poll_changes(service, account)
+        entry = self._entry(account, folder_id)
+        # One session lists a folder while the others wait for its result.
+        with entry.lock:
+            now = time.time()
+            if entry.table is None or now - entry.listed_at > self.full_refresh:
+                entry.table = FileTable.from_drive(list_files(service, folder_id), parent=folder_id)
+                entry.listed_at = now
+            with self._lock:
+                pending, entry.pending = entry.pending, []
+            for changes in pending:
+                entry.table = _merge_changes(entry.table, folder_id, changes)
+            return entry.table
+
+    def _poll_changes(self, service, account):
+        cursor = self._cursor(account)
+        with cursor.lock:
+            now = time.time()
+            if cursor.token is None:
+                cursor.token = get_start_page_token(service)
+                cursor.checked_at = now
+                return
+            if now - cursor.checked_at <= self.probe_interval:
+                return
+            try:
+                changes, cursor.token = list_changes(service, cursor.token)
+            except Exception:
+                # An expired or rejected token: start over from fresh listings.
+                cursor.token = get_start_page_token(service)
+                cursor.checked_at = now
+                self._drop_entries(account)
+                return
+            cursor.checked_at = now
+            if changes:
+                self._apply_changes(account, changes)
+
+    def _apply_changes(self, account, changes):
+        with self._lock:
+            entries = [(key[1], entry) for key, entry in self._entries.items() if key[0] == account]
+        for folder_id, entry in entries:
+            # Never wait for a folder that is being listed, which can take many
+            # pages: its changes are queued and merged by the next reader.
+            # Merging is idempotent, so changes the listing already saw are harmless.
+            if not entry.lock.acquire(blocking=False):
+                with self._lock:
+                    entry.pending.append(changes)
+                continue
+            try:
+                if entry.table is not None:
+                    entry.table = _merge_changes(entry.table, folder_id, changes)
+            finally:
+                entry.lock.release()
+
+    def _drop_entries(self, account, folder_id=None):
+        with self._lock:
+            keys = [key for key in self._entries
+                    if key[0] == account and (folder_id is None or key[1] == folder_id)]
+            for key in keys:
+                del self._entries[key]
+
+    def invalidate(self, account, folder_id=None):
+        """Force a full re-listing of one folder, or of every folder of ``account``."""
+        self._drop_entries(account, folder_id)
+
+
+def _merge_changes(table, folder_id, changes):
+    """Apply changes-feed entries to the listing of ``folder_id``."""
+    present = set(table.ids)
+    upserts = {}
+    removed = set()
+    for change in changes:
+        f = change.get("file")
+        file_id = change["fileId"]
+        if change.get("removed") or not f or f.get("trashed") or folder_id not in f.get("parents", ()):
+            upserts.pop(file_id, None)
+            if file_id in present:
+                removed.add(file_id)
+        else:
+            upserts[file_id] = f
+            removed.discard(file_id)
+    if upserts or removed:
+        return table.merge(upserts.values(), parent=folder_id, removed=removed)
+    return table
+
+
+class SearchCache:
+    """Small process-wide LRU of recent search results, as FileTables."""
+
+    def __init__(self, ttl=SEARCH_TTL_SECONDS, max_entries=SEARCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def search(self, service, account, query_text):
+        key = (account, query_text)
+        now = time.time()
+        with self._lock:
+            hit = self._results.get(key)
+            if hit and now - hit[0] <= self.ttl:
+                self._results.move_to_end(key)
+                return hit[1]
+        table = FileTable.from_drive(search_files(service, query_text))
+        with self._lock:
+            self._results[key] = (now, table)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return table
+
+    def invalidate(self, account):
+        with self._lock:
+            for key in [key for key in self._results if key[0] == account]:
+                del self._results[key]
@@ -0,0 +1,575 @@
+"""Load-testing harness: many concurrent sessions on one App.py server, backed by a fake Drive.
+
+The harness starts a real Streamlit server for App.py (what ``streamlit run
+App.py`` starts) and connects scripted browser sessions to it over the same
+websocket protocol the web frontend uses. So every session shares the one
+server's listing and search caches, file store and job workers, as in
+production. The sessions step through the real page flow: Dashboard, File
+Browser, Search, then Upload. Drive is replaced by ``fake_drive.FakeDrive``,
+which lives in the harness process, is served to the app server through a
+multiprocessing manager, adds configurable latency and counts every API call.
+
+Example::
+
+    python loadtest.py --users 1,2,4,8,16,32 --duration 30 --latency 0.08 \\
+        --files-per-folder 2000 --json results.json
+
+Each ramp step gets a fresh server, warmed up by one session. The report shows,
+per step:
+- rerun latency percentiles
+- actions/s
+- Drive calls per action
+- the server's CPU use
+- memory per session: how much the server process grew, divided by the
+  number of sessions.
+
+The saturation point is the first step where throughput stops growing or p95
+latency goes over the SLO.
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from multiprocessing.managers import BaseManager
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "App.py")
+ACCOUNT = "loadtest@example.iam.gserviceaccount.com"
+
+PAGES = {
+    "dashboard": "🏠 Dashboard",
+    "browser": "📄 File Browser",
+    "search": "🔍 Search Files",
+    "upload": "📤 Upload Center",
+}
+FLOW = ["dashboard", "browser", "search", "upload"]
+
+WORDS = ["invoice", "receipt", "contract", "report", "policy", "proposal", "budget", "payroll",
+         "campaign", "license", "agreement", "minutes", "handbook", "forecast", "audit", "lead"]
+MIME_TYPES = ["application/pdf", "image/png", "application/vnd.google-apps.document",
+              "application/vnd.google-apps.spreadsheet", "text/csv", "video/mp4"]
+
+SERVER_START_TIMEOUT = 60
+
+# ---------------------------------------
+# MEASUREMENT HELPERS
+# ---------------------------------------
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+# The server's memory and CPU are read from /proc, so these figures are
+# only reported on Linux.
+def process_rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def process_cpu_seconds(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rpartition(")")[2].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+class StepStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = 0
+        self.uploads_queued = 0
+
+    def record(self, action, seconds, error=False):
+        with self.lock:
+            self.latencies[action].append(seconds)
+            if error:
+                self.errors += 1
+
+    def add_error(self):
+        with self.lock:
+            self.errors += 1
+
+# ---------------------------------------
+# SHARED FAKE DRIVE
+# ---------------------------------------
+# The FakeDrive lives in the harness, where it is seeded and its calls are
+# counted, and the app server reaches it through a multiprocessing manager.
+# Requests cross the process boundary as plain data (see FakeDrive.call).
+
+class DriveManager(BaseManager):
+    pass
+
+def serve_drive(drive):
+    DriveManager.register("drive", callable=lambda: drive)
+    server = DriveManager(address=("127.0.0.1", 0)).get_server()
+    threading.Thread(target=server.serve_forever, name="fake-drive", daemon=True).start()
+    return server.address
+
+def connect_drive(address):
+    DriveManager.register("drive")
+    manager = DriveManager(address=address)
+    manager.connect()
+    return manager.drive()
+
+# ---------------------------------------
+# ENVIRONMENT
+# ---------------------------------------
+def prepare_data_dir(data_dir):
+    """Environment shared by the harness and the app server."""
+    os.environ["DRIVE_MANAGER_DATA_DIR"] = data_dir
+    key_path = os.path.join(data_dir, "credentials.json")
+    with open(key_path, "w") as f:
+        json.dump({"type": "service_account", "client_email": ACCOUNT}, f)
+    os.environ["DRIVE_MANAGER_CREDENTIALS"] = key_path
+
+def install_fake_drive(drive):
+    """Point the app at ``drive``. Must run before App.py is first run."""
+    from google.oauth2 import service_account
+    from googleapiclient import discovery
+    from fake_drive import FakeService
+
+    service_account.Credentials.from_service_account_info = lambda info, **kwargs: ("fake-credentials", info)
+    discovery.build = lambda *args, **kwargs: FakeService(drive)
+
+def seed_drive(drive, files_per_folder, rng):
+    from drive_helpers import FOLDER_MIME_TYPE, MAIN_FOLDER_NAME, SUBFOLDERS
+    from fake_drive import now_rfc3339
+
+    main_id = drive.add(MAIN_FOLDER_NAME, mime_type=FOLDER_MIME_TYPE)
+    folder_ids = {}
+    for name in SUBFOLDERS:
+        folder_ids[name] = folder_id = drive.add(name, parent=main_id, mime_type=FOLDER_MIME_TYPE)
+        for idx in range(files_per_folder):
+            drive.add(
+                f"{rng.choice(WORDS)} {rng.choice(WORDS)} {idx:06d}",
+                parent=folder_id,
+                mime_type=rng.choice(MIME_TYPES),
+                size=rng.randint(10_000, 20_000_000),
+                modified_time=now_rfc3339(-rng.randint(3600, 365 * 86400)),
+            )
+    return folder_ids
+
+# ---------------------------------------
+# APP SERVER
+# ---------------------------------------
+def app_server_process(address, port, job_workers):
+    """Entry point of the app server: ``streamlit run App.py`` on the fake Drive."""
+    os.environ["DRIVE_MANAGER_JOB_WORKERS"] = str(job_workers)
+    install_fake_drive(connect_drive(address))
+    sys.stdout = open(os.devnull, "w")
+
+    from streamlit.web import bootstrap
+
+    flag_options = {
+        "server_port": port,
+        "server_address": "127.0.0.1",
+        "server_headless": True,
+        "server_fileWatcherType": "none",
+        "browser_gatherUsageStats": False,
+        "logger_level": "error",
+    }
+    bootstrap.load_config_options(flag_options)
+    bootstrap.run(APP_PATH, False, [], flag_options)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class AppServer:
+    """One App.py server process for the duration of a ``with`` block."""
+
+    def __init__(self, ctx, address, job_workers):
+        self.port = free_port()
+        self.url = f"ws://127.0.0.1:{self.port}/_stcore/stream"
+        self.process = ctx.Process(target=app_server_process, args=(address, self.port, job_workers),
+                                   name="app-server", daemon=True)
+
+    def __enter__(self):
+        self.process.start()
+        health = f"http://127.0.0.1:{self.port}/_stcore/health"
+        deadline = time.time() + SERVER_START_TIMEOUT
+        while time.time() < deadline and self.process.is_alive():
+            try:
+                with urllib.request.urlopen(health, timeout=1) as response:
+                    if response.status == 200:
+                        return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError("The App.py server did not start")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.join(10)
+        if self.process.is_alive():
+            self.process.kill()
+
+    def rss(self):
+        return process_rss_bytes(self.process.pid)
+
+    def cpu(self):
+        return process_cpu_seconds(self.process.pid)
+
+# ---------------------------------------
+# BROWSER SESSIONS
+# ---------------------------------------
+WIDGET_TYPES = ("radio", "selectbox", "text_input")
+
+class BrowserSession:
+    """A scripted stand-in for the web frontend, on the app's websocket.
+
+    Like the frontend it sends the value of every widget it has set with each
+    rerun, and waits for the script to finish before the next one.
+    """
+
+    def __init__(self, url, timeout):
+        from websockets.sync.client import connect
+
+        self.timeout = timeout
+        self._stack = contextlib.ExitStack()
+        self.ws = self._stack.enter_context(
+            connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=timeout)
+        )
+        self.values = {}
+        self.widgets = defaultdict(list)
+
+    def rerun(self):
+        """Run the script once; returns True if it raised or failed to compile."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        for widget_id, value in self.values.items():
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            state.string_value = value
+        self.ws.send(msg.SerializeToString())
+
+        self.widgets = defaultdict(list)
+        error = False
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(self.ws.recv(timeout=self.timeout))
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element_type = fwd.delta.new_element.WhichOneof("type")
+                if element_type in WIDGET_TYPES:
+                    in_sidebar = fwd.metadata.delta_path[0] == 1
+                    self.widgets[element_type, in_sidebar].append(getattr(fwd.delta.new_element, element_type))
+                elif element_type == "exception":
+                    error = True
+            elif kind == "script_finished":
+                return error or fwd.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR
+
+    def widget(self, element_type, sidebar=False):
+        return self.widgets[element_type, sidebar][0]
+
+    def set(self, widget, value):
+        self.values[widget.id] = value
+
+    def close(self):
+        self._stack.close()
+
+# ---------------------------------------
+# VIRTUAL USERS
+# ---------------------------------------
+class VirtualUser(threading.Thread):
+    def __init__(self, idx, args, url, stats, step, upload_queue, folder_ids):
+        super().__init__(name=f"vu-{idx}", daemon=True)
+        self.args = args
+        self.url = url
+        self.stats = stats
+        self.step = step
+        self.upload_queue = upload_queue
+        self.folder_ids = folder_ids
+        self.folder_names = list(folder_ids)
+        self.rng = random.Random(args.seed + idx)
+        self.session = None
+
+    def timed(self, action, fn):
+        started = time.perf_counter()
+        try:
+            error = fn()
+        except Exception:
+            error = True
+        self.stats.record(action, time.perf_counter() - started, error)
+
+    def select(self, action, element_type, value, sidebar=False):
+        """Set a widget from the last run and rerun. ``value`` may be a
+        function of the widget's proto, e.g. to pick one of its options."""
+        def rerun():
+            widget = self.session.widget(element_type, sidebar)
+            self.session.set(widget, value(widget) if callable(value) else value)
+            return self.session.rerun()
+        self.timed(action, rerun)
+
+    def open(self):
+        self.session = BrowserSession(self.url, self.args.timeout)
+        self.timed("open", self.session.rerun)
+
+    def run(self):
+        # Always report in, even after a failed start, so run_step never waits forever.
+        try:
+            self.open()
+        except Exception:
+            self.stats.add_error()
+            return
+        finally:
+            self.step.ready.release()
+        try:
+            self.step.go.wait()
+            steps = 0
+            while time.time() < self.step.stop_at:
+                self.visit(FLOW[steps % len(FLOW)])
+                steps += 1
+                if self.args.think_time:
+                    time.sleep(self.rng.uniform(0, self.args.think_time))
+        finally:
+            self.session.close()
+
+    def visit(self, action):
+        getattr(self, f"do_{action}")()
+
+    def goto(self, action):
+        self.select(action, "radio", PAGES[action], sidebar=True)
+
+    def do_dashboard(self):
+        self.goto("dashboard")
+
+    def do_browser(self):
+        self.goto("browser")
+        self.select("browser_select", "selectbox", lambda widget: self.rng.choice(widget.options))
+
+    def do_search(self):
+        self.goto("search")
+        self.select("search_query", "text_input", self.rng.choice(WORDS))
+
+    def do_upload(self):
+        # Uploading through st.file_uploader needs the browser's HTTP upload
+        # endpoint as well, so the page is rendered and the batch is queued
+        # exactly as the Upload Center button does it. The server's workers run it.
+        self.goto("upload")
+        if not self.args.upload_files:
+            return
+        folder = self.rng.choice(self.folder_names)
+        spool_dir = self.upload_queue.new_spool_dir()
+        items = []
+        for idx in range(self.args.upload_files):
+            path = os.path.join(spool_dir, f"{idx:05d}_loadtest.bin")
+            with open(path, "wb") as f:
+                f.write(os.urandom(self.args.upload_size))
+            items.append((os.path.basename(path), {
+                "path": path, "name": os.path.basename(path), "parent": self.folder_ids[folder]
+            }))
+        self.upload_queue.submit("upload", ACCOUNT, f"Load test upload to {folder}", items, spool_dir=spool_dir)
+        with self.stats.lock:
+            self.stats.uploads_queued += len(items)
+
+class _Step:
+    def __init__(self):
+        self.ready = threading.Semaphore(0)
+        self.go = threading.Event()
+        self.stop_at = 0.0
+
+def warm_up(args, server, folder_ids):
+    """One session through every page and folder, so the step measures
+    sessions rather than the server's imports and first listings."""
+    vu = VirtualUser(0, argparse.Namespace(**{**vars(args), "upload_files": 0}), server.url,
+                     StepStats(), _Step(), None, folder_ids)
+    vu.open()
+    for action in FLOW:
+        vu.visit(action)
+    vu.goto("browser")
+    for idx in range(len(folder_ids)):
+        vu.select("browser_select", "selectbox", lambda widget, idx=idx: widget.options[idx])
+    vu.session.close()
+
+def run_step(users, args, ctx, address, drive, upload_queue, folder_ids):
+    with AppServer(ctx, address, args.job_workers) as server:
+        warm_up(args, server, folder_ids)
+        time.sleep(1)
+        baseline_rss = server.rss()
+
+        stats = StepStats()
+        step = _Step()
+        vus = [VirtualUser(i, args, server.url, stats, step, upload_queue, folder_ids) for i in range(users)]
+        for vu in vus:
+            vu.start()
+        for _ in vus:
+            step.ready.acquire()
+
+        calls_before = drive.total_calls()
+        cpu_before = server.cpu()
+        started = time.time()
+        step.stop_at = started + args.duration
+        step.go.set()
+        for vu in vus:
+            vu.join(args.duration + args.timeout)
+        wall = time.time() - started
+        # Taken while the sessions are still open on the server.
+        sessions_rss = server.rss()
+        cpu_after = server.cpu()
+        calls = drive.total_calls() - calls_before
+
+    # Opening the app happens before the timed window; it is only reported by action.
+    latencies = [v for action, values in stats.latencies.items() if action != "open" for v in values]
+    actions = len(latencies)
+    mem_mb = None
+    if baseline_rss is not None and sessions_rss is not None:
+        mem_mb = round(max(sessions_rss - baseline_rss, 0) / users / (1024 * 1024), 2)
+    return {
+        "users": users,
+        "actions": actions,
+        "errors": stats.errors,
+        "actions_per_s": round(actions / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "api_calls": calls,
+        "api_calls_per_action": round(calls / actions, 2) if actions else 0.0,
+        # Cores the app server kept busy.
+        "cpu_util": round((cpu_after - cpu_before) / wall, 2) if cpu_before is not None else None,
+        "mem_per_session_mb": mem_mb,
+        "uploads_queued": stats.uploads_queued,
+        "by_action": {
+            action: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+            }
+            for action, values in sorted(stats.latencies.items())
+        },
+    }
+
+def calibrate(args, ctx, address, drive, folder_ids):
+    """Drive calls per page visit for a single session on a fresh server, cold and warm cache.
+
+    The visits are the same as in the load steps: File Browser includes
+    picking a folder and Search includes running a query. Uploads are not queued.
+    """
+    with AppServer(ctx, address, args.job_workers) as server:
+        stats = StepStats()
+        vu = VirtualUser(0, argparse.Namespace(**{**vars(args), "upload_files": 0}), server.url,
+                         stats, _Step(), None, folder_ids)
+        before = drive.total_calls()
+        vu.open()
+        costs = {"open": {"cold": drive.total_calls() - before}}
+        for action in FLOW:
+            costs[action] = {}
+            for phase in ("cold", "warm"):
+                before = drive.total_calls()
+                vu.visit(action)
+                costs[action][phase] = drive.total_calls() - before
+        vu.session.close()
+    if stats.errors:
+        costs["errors"] = {"count": stats.errors}
+    return costs
+
+def find_saturation(results, slo_ms, min_gain):
+    previous = None
+    for result in results:
+        if result["p95_ms"] > slo_ms or result["errors"]:
+            return result["users"], "p95 over SLO" if result["p95_ms"] > slo_ms else "errors"
+        if previous and result["actions_per_s"] < previous["actions_per_s"] * (1 + min_gain):
+            return result["users"], "throughput flat"
+        previous = result
+    return None, None
+
+def print_report(costs, results, saturation, reason, slo_ms):
+    print("\nDrive calls per page visit (1 session):")
+    for action, phases in costs.items():
+        print(f"  {action:<10} " + ", ".join(f"{phase} {count}" for phase, count in phases.items()))
+
+    header = f"{'users':>5} {'actions/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/act':>9} " \
+             f"{'cpu':>5} {'MB/sess':>8} {'errors':>6}"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        cpu = "n/a" if r["cpu_util"] is None else r["cpu_util"]
+        mem = "n/a" if r["mem_per_session_mb"] is None else r["mem_per_session_mb"]
+        print(f"{r['users']:>5} {r['actions_per_s']:>9} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+              f"{r['api_calls_per_action']:>9} {cpu:>5} {mem:>8} {r['errors']:>6}")
+
+    if saturation:
+        print(f"\nSaturation at {saturation} concurrent users ({reason}; SLO p95 {slo_ms} ms)")
+    else:
+        print(f"\nNo saturation up to {results[-1]['users']} users (SLO p95 {slo_ms} ms)")
+
+# ---------------------------------------
+# COMMAND LINE
+# ---------------------------------------
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent sessions on one App.py server with a fake Drive.")
+    parser.add_argument("--users", default="1,2,4,8,16", help="Comma-separated ramp of concurrent users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per ramp step (default: 30)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake Drive latency per call in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Random +/- latency jitter in seconds")
+    parser.add_argument("--files-per-folder", type=int, default=500, help="Seeded files in each business folder")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Max random pause between actions")
+    parser.add_argument("--upload-files", type=int, default=3, help="Files queued per upload action (0 to skip)")
+    parser.add_argument("--upload-size", type=int, default=64 * 1024, help="Bytes per uploaded file")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-rerun timeout in seconds")
+    parser.add_argument("--job-workers", type=int, default=4, help="Upload job workers in the server (default: 4)")
+    parser.add_argument("--slo-ms", type=float, default=2000, help="p95 rerun latency considered saturated")
+    parser.add_argument("--min-gain", type=float, default=0.10,
+                        help="Throughput gain below which a step counts as saturated (default: 0.10)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Also write the results to this file")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    ramp = [int(n) for n in args.users.split(",") if n.strip()]
+
+    data_dir = tempfile.mkdtemp(prefix="drive-loadtest-")
+    prepare_data_dir(data_dir)
+
+    from fake_drive import FakeDrive
+    from jobs import JobQueue
+
+    drive = FakeDrive(latency=args.latency, jitter=args.jitter)
+    folder_ids = seed_drive(drive, args.files_per_folder, random.Random(args.seed))
+    address = serve_drive(drive)
+    # Submission only; the app server's workers process the jobs.
+    upload_queue = JobQueue(workers=0)
+
+    # Spawned rather than forked: the harness already runs threads.
+    ctx = multiprocessing.get_context("spawn")
+
+    print(f"Seeded {len(drive.files)} fake files; state in {data_dir}", file=sys.stderr)
+    costs = calibrate(args, ctx, address, drive, folder_ids)
+
+    results = []
+    for users in ramp:
+        print(f"Running {users} user(s) for {args.duration:g}s...", file=sys.stderr)
+        results.append(run_step(users, args, ctx, address, drive, upload_queue, folder_ids))
+
+    saturation, reason = find_saturation(results, args.slo_ms, args.min_gain)
+    print_report(costs, results, saturation, reason, args.slo_ms)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"calibration": costs, "steps": results, "saturation_users": saturation,
+                       "saturation_reason": reason, "calls_by_method": drive.call_counts()}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())